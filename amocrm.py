@@ -7,221 +7,463 @@
 
 Основные функции:
 - send_to_telegram: Асинхронная функция для отправки сообщений в Telegram.
-- get_leads_from_amocrm: Функция для получения данных по сделкам из AmoCRM.
-- daily_report_revenue: Функция для генерации ежедневного отчета по доходам.
-- main: Основная функция, которая запускает процесс генерации и отправки отчета.
+- get_leads_from_amocrm: Функция для постраничного получения данных по сделкам из AmoCRM за заданный интервал.
+- daily_report_revenue: Асинхронная функция для генерации ежедневного отчета по доходам.
+- main_async: Асинхронная основная функция, которая запускает процесс генерации и отправки отчета.
+- scheduler: Асинхронный планировщик (APScheduler), запускающий отчет каждый день в 18:00.
+- shutdown: Асинхронная функция, закрывающая сетевые сессии при остановке процесса.
 
 """
 
 from aiogram import Bot, exceptions
-import requests
-import schedule
+from aiolimiter import AsyncLimiter
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_MISSED
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+import httpx
+import numpy as np
+import orjson
 import asyncio
 import datetime
-import time
 import logging
+import signal
 from config_tg import Config,load_config
 from config_amocrm import AmoCRM, load_amocrm
 
 
 # Настройка логирования. Логи сохраняются в файл "amocrm.log".
+# Служебные отметки о начале/окончании функций пишутся на уровне DEBUG и в файл не попадают;
+# на уровне INFO остаются только итог ежедневного отчета и время следующего запуска.
 logging.basicConfig(
     filename = 'amocrm.log',  
     level = logging.INFO,  
     format = '%(asctime)s - %(levelname)s - %(message)s', 
 )
+logger = logging.getLogger(__name__)
+
+# Общий асинхронный HTTP-клиент для запросов к AmoCRM. Пул соединений переиспользует TCP/TLS
+# между страницами и запусками отчета, транспорт повторяет неудачные попытки соединения.
+_HTTPX = httpx.AsyncClient(
+    transport=httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        retries=3,
+    ),
+    headers={'Content-Type': 'application/json'},
+)
+# Таймауты запроса к AmoCRM (соединение, чтение): зависший API не блокирует отчет бесконечно
+_AMOCRM_TIMEOUT = httpx.Timeout(27.0, connect=3.05)
+# Коды ответа AmoCRM, при которых запрос (как и при ошибке транспорта) повторяется с экспоненциальной задержкой
+_RETRY_STATUSES = {429, 502, 503, 504}
+_RETRY_TOTAL = 3
+_RETRY_BACKOFF = 0.3
+# Сколько страниц сделок AmoCRM запрашивается одновременно
+_PAGE_CONCURRENCY = 5
+# Ограничение частоты запросов к AmoCRM: не более 7 запросов в секунду на интеграцию (лимит AmoCRM)
+_AMOCRM_LIMIT = AsyncLimiter(7, 1)
+
+# Бот Telegram создается при первой отправке и переиспользуется вместе с его HTTP-сессией
+_BOT: Bot | None = None
+_BOT_LOCK = asyncio.Lock()
+
+
+async def _get_bot(token: str) -> Bot:
+    """Возвращает общий экземпляр бота Telegram, создавая его при первом вызове."""
+    global _BOT
+    async with _BOT_LOCK:
+        if _BOT is None:
+            _BOT = Bot(token=token)
+    return _BOT
+
+
+# Ограничение частоты отправки: не более 30 сообщений в секунду на бота (лимит Telegram)
+_TG_LIMIT = AsyncLimiter(30, 1)
+
+
+async def _send_message(bot: Bot, chat_id: str, text: str):
+    """Отправка сообщения с учетом лимита Telegram и одним повтором после `TelegramRetryAfter`."""
+    try:
+        async with _TG_LIMIT:
+            await bot.send_message(chat_id=chat_id, text=text)
+    except exceptions.TelegramRetryAfter as e:
+        logger.warning('Telegram flood control: retry after %s s', e.retry_after)
+        await asyncio.sleep(e.retry_after)
+        async with _TG_LIMIT:
+            await bot.send_message(chat_id=chat_id, text=text)
 
 
 async def send_to_telegram(message: str):
     """Отправка сообщения в Telegram определенному пользователю.
 
     Эта функция отправляет сообщение в Telegram с использованием токена и идентификатора чата,
-    указанных в конфигурации. Обрабатываются различные исключения, возникающие при работе с API Telegram.
+    указанных в конфигурации. Отправка ограничена лимитом `_TG_LIMIT`, а при ответе Telegram
+    `RetryAfter` сообщение повторно отправляется один раз после указанной паузы.
+    Обрабатываются различные исключения, возникающие при работе с API Telegram.
 
     Параметры:
     - message (str): Сообщение, которое необходимо отправить.
 
     Исключения:
-    - BadRequest: Ошибка возникает, когда запрос некорректен.
-    - Unauthorized: Ошибка возникает, когда токен бота недействителен.
-    - ChatNotFound: Ошибка возникает, когда чат с указанным идентификатором не найден.
+    - TelegramBadRequest: Ошибка возникает, когда запрос некорректен (в том числе чат не найден).
+    - TelegramUnauthorizedError: Ошибка возникает, когда токен бота недействителен.
+    - TelegramForbiddenError: Ошибка возникает, когда бот не может писать в указанный чат.
     - TelegramAPIError: Ошибка возникает при любой другой ошибке API Telegram.
     - Exception: Любая другая неожиданная ошибка.
 
     Возвраты:
     - None: Функция ничего не возвращает.
     """
-    logging.info('Start - send_to_telegram')
+    logger.debug('Start - send_to_telegram')
     config: Config = load_config()
-    bot = Bot(token=config.tg_bot.token)
+    bot = await _get_bot(config.tg_bot.token)
 
     try:
-        await bot.send_message(chat_id=config.tg_bot.admin_ids, text=message)
-    except exceptions.BadRequest as e:
-        logging.error(f'BadRequest error occurred: {e}')
-    except exceptions.Unauthorized as e:
-        logging.error(f'Unauthorized error: {e}. Check your bot token.')
-    except exceptions.ChatNotFound as e:
-        logging.error(f'ChatNotFound error: {e}. Check the chat ID.')
+        await _send_message(bot, chat_id=config.tg_bot.admin_ids, text=message)
+    except exceptions.TelegramBadRequest as e:
+        logger.error('BadRequest error occurred: %s. Check the chat ID.', e)
+    except exceptions.TelegramUnauthorizedError as e:
+        logger.error('Unauthorized error: %s. Check your bot token.', e)
+    except exceptions.TelegramForbiddenError as e:
+        logger.error('Forbidden error: %s. Check the chat ID.', e)
     except exceptions.TelegramAPIError as e:
-        logging.error(f'Telegram API error: {e}')
+        logger.error('Telegram API error: %s', e)
     except Exception as e:
-        logging.error(f'An unexpected error occurred: {e}')
+        logger.error('An unexpected error occurred: %s', e)
 
-    logging.info('send_to_telegram - finish')
+    logger.debug('send_to_telegram - finish')
     return 
     
 
-def get_leads_from_amocrm(account_id, token):
-    """Получение данных по всем сделкам из AmoCRM.
+async def _send_with_retries(request: httpx.Request) -> httpx.Response:
+    """Отправка запроса к AmoCRM с повтором при ошибках транспорта и ответах из `_RETRY_STATUSES`.
 
-    Эта функция выполняет GET-запрос к API AmoCRM для получения информации о сделках.
-    В случае возникновения ошибок HTTP, проблем с соединением или таймаута, они будут логированы,
-    и функция вернет `None`.
+    Повторяются таймауты и обрывы соединения посреди запроса (`httpx.TransportError`:
+    `ReadError`, `RemoteProtocolError` и т.д.), а не только неудачные попытки соединения,
+    которые повторяет транспорт клиента.
+    """
+    for attempt in range(_RETRY_TOTAL + 1):
+        try:
+            async with _AMOCRM_LIMIT:
+                response = await _HTTPX.send(request)
+        except httpx.TransportError as transport_err:
+            if attempt == _RETRY_TOTAL:
+                raise
+            logger.warning('AmoCRM request failed: %r, retrying', transport_err)
+        else:
+            if response.status_code not in _RETRY_STATUSES or attempt == _RETRY_TOTAL:
+                return response
+        await asyncio.sleep(_RETRY_BACKOFF * 2 ** attempt)
+
+
+async def _fetch_leads_page(url: str, headers: dict, params: dict | None) -> tuple[list, int | None, str | None]:
+    """Загрузка одной страницы сделок AmoCRM.
+
+    Возвращает список сделок страницы, общее число страниц (`_page_count`), если AmoCRM
+    его передал, иначе `None`, и ссылку на следующую страницу (`_links.next.href`) или `None`,
+    если страница последняя.
+    """
+    request = _HTTPX.build_request(
+        'GET', url, headers=headers, params=params, timeout=_AMOCRM_TIMEOUT,
+    )
+    try:
+        response = await _send_with_retries(request)
+        response.raise_for_status()
+    except httpx.TimeoutException as timeout_err:
+        logger.error('AmoCRM request timed out after %s retries: %r', _RETRY_TOTAL, timeout_err)
+        raise
+    except httpx.HTTPError as req_err:
+        # временные ошибки (429, 5xx, обрывы соединения) к этому моменту уже повторены
+        logger.error('Request to AmoCRM failed: %s', req_err)
+        raise
+
+    # AmoCRM отвечает 204 No Content, если на странице нет ни одной сделки
+    if response.status_code == 204:
+        return [], None, None
+    # orjson разбирает страницу в несколько раз быстрее стандартного json и возвращает те же dict/list
+    data = orjson.loads(response.content)
+    next_page = data.get('_links', {}).get('next', {}).get('href')
+    return data['_embedded']['leads'], data.get('_page_count'), next_page
+
+
+async def get_leads_from_amocrm(account_id, token, date_from: int, date_to: int, page_limit=250):
+    """Получение данных по сделкам из AmoCRM, созданным в заданном интервале.
+
+    Эта асинхронная функция выполняет GET-запросы к API AmoCRM через общий клиент `_HTTPX`
+    для получения информации о сделках. Фильтрация по дате создания выполняется
+    на стороне сервера (`filter[created_at]`). Если AmoCRM сообщил `_page_count`, после первой
+    страницы остальные запрашиваются параллельно (не более `_PAGE_CONCURRENCY` запросов
+    одновременно), иначе страницы обходятся по ссылке `_links.next.href`. Частота запросов
+    ограничена `_AMOCRM_LIMIT`, чтобы не упираться в лимит API AmoCRM.
+    Временные ошибки повторяются с экспоненциальной задержкой; если повторы
+    не помогли, ошибка логируется и пробрасывается дальше вызывающему коду.
 
     Параметры:
     - account_id (str): Идентификатор аккаунта AmoCRM.
     - token (str): Токен для доступа к AmoCRM.
+    - date_from (int): Начало интервала (unix timestamp), включительно.
+    - date_to (int): Конец интервала (unix timestamp), включительно.
+    - page_limit (int): Количество сделок на одной странице (максимум 250).
 
     Возвращаемое значение:
-    - requests.Response: Ответ от сервера AmoCRM, если запрос успешный.
-    - None: Если произошла ошибка.
+    - AsyncIterator[dict]: Сделки, созданные в заданном интервале.
 
     Исключения:
-    - requests.exceptions.HTTPError: Ошибка HTTP.
-    - requests.exceptions.ConnectionError: Ошибка соединения.
-    - requests.exceptions.Timeout: Таймаут запроса.
-    - requests.exceptions.RequestException: Общая ошибка запроса.
+    - httpx.HTTPStatusError: Ошибка HTTP.
+    - httpx.ConnectError: Ошибка соединения.
+    - httpx.TimeoutException: Таймаут запроса.
+    - httpx.HTTPError: Общая ошибка запроса.
     """
-    logging.info('Start get_leads_from_amocrm')
+    logger.debug('Start get_leads_from_amocrm')
     url = f'https://{account_id}.amocrm.ru/api/v4/leads'
     
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json',
+    headers = {'Authorization': f'Bearer {token}'}
+    params = {
+        'filter[created_at][from]': date_from,
+        'filter[created_at][to]': date_to,
+        'limit': page_limit,
     }
 
-    try:
-        response = requests.get(url, headers=headers)
-    except requests.exceptions.HTTPError as http_err:
-        logging.error(f'HTTPError occurred: {http_err}')  # Ошибка HTTP
-        return None
-    except requests.exceptions.ConnectionError as conn_err:
-        logging.error(f'ConnectionError occurred: {conn_err}')  # Ошибка соединения
-        return None
-    except requests.exceptions.Timeout as timeout_err:
-        logging.error(f'TimeoutError occurred: {timeout_err}')  # Время ожидания истекло
-        return None
-    except requests.exceptions.RequestException as req_err:
-        logging.error(f'General exception occurred: {req_err}')  # Общая ошибка запроса
-        return None
-
-    logging.info('Finished get_leads_from_amocrm')
-    return response
-
-
-def daily_report_revenue():
+    leads, page_count, next_page = await _fetch_leads_page(url, headers, {**params, 'page': 1})
+    for lead in leads:
+        yield lead
+
+    if next_page and page_count is not None:
+        # число страниц известно: оставшиеся страницы запрашиваются параллельно
+        semaphore = asyncio.Semaphore(_PAGE_CONCURRENCY)
+
+        async def fetch(page):
+            async with semaphore:
+                return await _fetch_leads_page(url, headers, {**params, 'page': page})
+
+        pages = await asyncio.gather(*(fetch(p) for p in range(2, page_count + 1)))
+        for leads, _, _ in pages:
+            for lead in leads:
+                yield lead
+    else:
+        # число страниц неизвестно: идем по ссылке на следующую страницу, пока она есть;
+        # ссылка уже содержит все параметры запроса
+        while next_page:
+            leads, _, next_page = await _fetch_leads_page(next_page, headers, None)
+            for lead in leads:
+                yield lead
+
+    logger.debug('Finished get_leads_from_amocrm')
+
+
+def _day_bounds(day: datetime.date) -> tuple[int, int]:
+    """Границы дня `[lo, hi)` в виде unix timestamp по локальному времени.
+
+    Верхняя граница - полночь следующего дня, а не `lo + 86400`, поэтому дни
+    перехода на летнее/зимнее время тоже обрабатываются корректно.
+    """
+    lo = int(datetime.datetime.combine(day, datetime.time.min).timestamp())
+    hi = int(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min).timestamp())
+    return lo, hi
+
+
+async def daily_report_revenue():
     """Генерация ежедневного отчета по доходам.
 
-    Эта функция собирает данные о сделках из AmoCRM, фильтрует сделки, созданные сегодня, и суммирует доходы по менеджерам.
+    Эта асинхронная функция запрашивает из AmoCRM сделки, созданные сегодня, и суммирует доходы по менеджерам.
     Затем формирует отчет, в котором каждому менеджеру соответствует сумма доходов за день.
 
     Возвращаемое значение:
-    - dict: Словарь, ключами которого являются идентификаторы менеджеров, а значениями — суммы доходов за сегодняшний день.
-      Например: `{123: 10000, 456: 5000}`, где `123` и `456` — идентификаторы менеджеров, а `10000` и `5000` — соответствующие им доходы.
+    - tuple[datetime.date, dict]: Дата отчета и словарь, ключами которого являются идентификаторы менеджеров,
+      а значениями — суммы доходов за этот день. Дата возвращается, чтобы отчет использовал тот же день,
+      за который считалась выручка.
+      Например: `(date(2024, 11, 22), {123: 10000, 456: 5000})`, где `123` и `456` — идентификаторы менеджеров,
+      а `10000` и `5000` — соответствующие им доходы.
 
     Исключения:
     - Exception: Может возникнуть любая непредвиденная ошибка при загрузке конфигурации AmoCRM или получении данных сделок.
     - KeyError: При отсутствии ожидаемых ключей в ответе от AmoCRM.
     - TypeError: При неверном формате ответа от AmoCRM.
     """
-    logging.info('Start - daily_report_revenue')
+    logger.debug('Start - daily_report_revenue')
+    today = datetime.date.today()
     # проверяем успешную конфигурации для AmoCRM
     try:
         config_amocrm: AmoCRM = load_amocrm() 
     except Exception as e:
-        logging.error(f'Error loading AmoCRM configuration: {e}')
-        return {}
-    # проверяем успешную загрузку данных по сделкам для AmoCRM
-    try:
-        data = get_leads_from_amocrm(account_id=config_amocrm.account_id, token=config_amocrm.token)
-    except Exception as e:
-        logging.error(f'Error getting leads from AmoCRM: {e}')
-        return {}
-
-    if data is None:
-        logging.error('No data returned from get_leads_from_amocrm')
-        return {}
+        logger.error('Error loading AmoCRM configuration: %s', e)
+        return today, {}
 
-    if isinstance(data, dict) and data.get('status_code') != 200:
-        logging.error(f'Error fetching deals: {data.get("status_code")}')
-        return {}
+    # границы сегодняшнего дня вычисляются один раз и используются и в фильтре на стороне AmoCRM,
+    # и для проверки сделок, поэтому сравнение по каждой сделке - одно целочисленное сравнение
+    lo, hi = _day_bounds(today)
 
+    # поля сделок, нужные для отчета, собираются по столбцам для векторного подсчета
+    created_at, user_ids, prices = [], [], []
+    # проверяем успешную загрузку данных по сделкам для AmoCRM
     try:
-        deals = data.json()['_embedded']['leads']
+        deals = get_leads_from_amocrm(
+            account_id=config_amocrm.account_id,
+            token=config_amocrm.token,
+            date_from=lo,
+            date_to=hi - 1,
+        )
+        async for deal in deals:
+            created_at.append(deal.get('created_at') or 0)
+            user_ids.append(deal.get('responsible_user_id') or 0)
+            prices.append(deal.get('price') or 0)
     except (KeyError, TypeError) as e:
-        logging.error(f'Error processing deals data: {e}. Data received: {data}')
-        return {}
-    # список менеджеров в виде словаря. Заполняется id менеджера - доходы
-    revenue_by_manager = {}
-    # проходимся по всем сделкам и сравниваем дату создания. Если дата совпадает с сегодня - делаем расчет дохода
-    for deal in deals:
-        created_at = deal.get('created_at')
-        responsible_user_id = deal.get('responsible_user_id')
-        price = deal.get('price', 0)
-
-        if created_at and responsible_user_id:
-            created_date = datetime.datetime.fromtimestamp(created_at).date()
-            current_date = datetime.date.today()
-
-            if created_date == current_date:
-                if responsible_user_id not in revenue_by_manager:
-                    revenue_by_manager[responsible_user_id] = 0
-                revenue_by_manager[responsible_user_id] += price
-
-    logging.info('daily_report_revenue - finish')
-    return revenue_by_manager
-
-   
-def main():
+        logger.error('Error processing deals data: %s', e)
+        return today, {}
+    except Exception as e:
+        logger.error('Error getting leads from AmoCRM: %s', e)
+        return today, {}
+
+    # суммируем доход по менеджерам в numpy: фильтр по дате и группировка выполняются без цикла в Python.
+    # id менеджеров сначала переводятся в плотные индексы, чтобы bincount не создавал массив размером max(id).
+    ts = np.asarray(created_at, dtype=np.int64)
+    uid = np.asarray(user_ids, dtype=np.int64)
+    price = np.asarray(prices)
+    mask = (ts >= lo) & (ts < hi) & (uid != 0)
+    managers, index = np.unique(uid[mask], return_inverse=True)
+    totals = np.bincount(index, weights=price[mask], minlength=len(managers))
+    if np.issubdtype(price.dtype, np.integer):
+        totals = totals.astype(np.int64)
+    # список менеджеров в виде словаря: id менеджера - доходы
+    revenue_by_manager = dict(zip(managers.tolist(), totals.tolist()))
+
+    logger.debug('daily_report_revenue - finish')
+    return today, revenue_by_manager
+
+
+# Заголовок отчета; подставляется дата, за которую посчитана выручка
+_REPORT_HEADER = 'Отчет по выручке на {d}:\n\n'
+# Максимальная длина одного сообщения отчета (Telegram отклоняет сообщения длиннее 4096 символов)
+MESSAGE_LIMIT = 4000
+
+
+def _split_report(header: str, lines: list[str], limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Разбивает отчет на сообщения не длиннее `limit` символов, не разрывая строки по менеджерам."""
+    messages = []
+    chunk, size = [], len(header)
+    for line in lines:
+        # +1 - перевод строки между строками отчета
+        if chunk and size + len(line) + 1 > limit:
+            messages.append('\n'.join(chunk))
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line) + 1
+    messages.append('\n'.join(chunk))
+    messages[0] = header + messages[0]
+    return messages
+
+
+async def main_async():
     """Основная функция программы.
 
-    Эта функция запускает процесс генерации ежедневного отчета по доходам и отправки его в Telegram.
+    Эта асинхронная функция запускает процесс генерации ежедневного отчета по доходам и отправки его в Telegram.
     В случае успешного сбора данных отчет формируется и отправляется в виде сообщения в Telegram.
     Если возникают ошибки, они логируются, и пользователю отправляется соответствующее уведомление.
 
     Исключения:
     - Exception: Может возникнуть любая непредвиденная ошибка при выполнении главной функции.
     """
-    logging.info('Start - main')
+    logger.debug('Start - main_async')
     try:
-        revenue = daily_report_revenue()
+        today, revenue = await daily_report_revenue()
 
         if revenue:
-            message = f'Отчет по выручке на {datetime.date.today()}:\n\n'
-            for manager_id, total_revenue in revenue.items():
-                message += f"Менеджер ID: {manager_id}, Выручка: {total_revenue}\n"
-            #отправка сообщения в телеграмм с данными по доходам
-            asyncio.run(send_to_telegram(message))
-            logging.info('Report sent to Telegram user')
+            header = _REPORT_HEADER.format(d=today)
+            # строки отчета объединяются через str.join, а не наращиванием строки через +=
+            lines = [f"Менеджер ID: {manager_id}, Выручка: {total_revenue}" for manager_id, total_revenue in revenue.items()]
+            #отправка сообщения в телеграмм с данными по доходам.
+            #менеджеры собираются в как можно меньшее число сообщений, чтобы не упираться в лимит частоты Telegram;
+            #отчет делится на части только если не помещается в одно сообщение
+            for message in _split_report(header, lines):
+                await send_to_telegram(message)
+            logger.info('Report sent to Telegram user')
         else:
             error_message = "Не удалось получить данные по выручке."
-            asyncio.run(send_to_telegram(error_message))
-            logging.error(error_message)
+            await send_to_telegram(error_message)
+            logger.error(error_message)
 
     except Exception as e:
-        logging.error(f'Error in main execution: {e}')
-        asyncio.run(send_to_telegram("Не удалось выполнить главную функцию."))
+        logger.error('Error in main execution: %s', e)
+        await send_to_telegram("Не удалось выполнить главную функцию.")
 
-# Отправка отчета каждый день в 18:00
-schedule.every().day.at("18:00").do(main)  
 
+# Сколько секунд после 18:00 отчет еще можно запустить, если запуск был пропущен
+# (например, процесс был приостановлен или цикл событий был занят)
+REPORT_MISFIRE_GRACE_TIME = 60 * 60
 
-if __name__ == '__main__':
-    # Запускаем цикл для проверки задач. 
-    while True:
-        logging.info('Checking scheduled tasks...')
-        schedule.run_pending()
-        time.sleep(60) # Проверка задач каждую минуту
 
+def _on_job_event(event):
+    """Логирование ошибок и пропусков ежедневного отчета.
+
+    Исключение внутри задачи не останавливает планировщик: оно логируется здесь,
+    а следующий отчет запускается в обычное время.
+    """
+    if event.code == EVENT_JOB_MISSED:
+        logger.warning('Scheduled report missed its run time %s', event.scheduled_run_time)
+    else:
+        logger.error('Scheduled report failed: %r', event.exception, exc_info=event.exception)
+
+
+async def scheduler():
+    """Ежедневный запуск отчета в 18:00.
+
+    Отчет запускается планировщиком APScheduler (`AsyncIOScheduler` с `CronTrigger`):
+    процесс спит до 18:00 на таймере цикла событий без периодических пробуждений.
+    Планировщик работает в одном цикле событий на весь процесс, поэтому HTTP-клиент AmoCRM
+    и бот Telegram переиспользуют свои соединения между запусками.
+    Ошибки задачи не завершают планировщик (см. `_on_job_event`), а опоздавший
+    запуск выполняется, если опоздание меньше `REPORT_MISFIRE_GRACE_TIME`.
+    """
+    sched = AsyncIOScheduler()
+    sched.add_listener(_on_job_event, EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+    job = sched.add_job(
+        main_async,
+        CronTrigger(hour=18, minute=0),
+        misfire_grace_time=REPORT_MISFIRE_GRACE_TIME,
+        coalesce=True,
+    )
+    sched.start()
+    logger.info('Next report scheduled at %s', job.next_run_time)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        sched.shutdown(wait=False)
 
+
+async def shutdown():
+    """Закрытие сетевых сессий бота Telegram и клиента AmoCRM.
+
+    Вызывается один раз при остановке процесса, чтобы соединения с api.telegram.org
+    и AmoCRM были закрыты корректно, а не оборваны при выходе.
+    """
+    global _BOT
+    if _BOT is not None:
+        await _BOT.session.close()
+        _BOT = None
+    await _HTTPX.aclose()
+
+
+async def run():
+    """Запуск планировщика с закрытием сессий при остановке (Ctrl+C или SIGTERM от docker).
+
+    Исключения:
+    - environs.EnvError: Если в окружении нет обязательных переменных конфигурации.
+    """
+    # конфигурация проверяется при старте процесса, а не при первом отчете в 18:00
+    load_config()
+    load_amocrm()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except NotImplementedError:
+        # цикл событий Windows не поддерживает обработчики сигналов; Ctrl+C
+        # по-прежнему отменяет задачу через asyncio.run, и сессии закрываются в finally
+        pass
+    try:
+        await scheduler()
+    except asyncio.CancelledError:
+        logger.info('Scheduler stopped')
+    finally:
+        await shutdown()
+
+
+if __name__ == '__main__':
+    # Запускаем ежедневную отправку отчета
+    asyncio.run(run())
@@ -19,8 +19,13 @@
 """
 
 from dataclasses import dataclass
+from functools import lru_cache
 from environs import Env 
 
+# Переменные окружения и файл .env читаются один раз при импорте модуля
+_env = Env()
+_env.read_env()
+
 @dataclass
 class AmoCRM():
     """
@@ -34,26 +39,29 @@ class AmoCRM():
     token: str
 
 
+@lru_cache(maxsize=1)
 def load_amocrm(path: str | None = None) -> AmoCRM:
     """
     Загружает конфигурацию для доступа к API AmoCRM из .env файла.
 
     Аргументы:
         path (str | None): Опциональный путь к .env файлу. 
-            Если не указан, будет использован файл по умолчанию.
+            Если не указан, используются переменные, прочитанные при импорте модуля.
     
     Возвращает:
         AmoCRM: Возвращает экземпляр класса AmoCRM, 
         содержащий идентификатор аккаунта и токен доступа.
+
+    Повторные вызовы возвращают закешированный объект без повторного чтения .env.
     
     Исключения:
         Raises KeyError если переменные окружения (ACCOUNT_ID или TOKEN_AMOCRM) не найдены.
     """
     
-    env = Env()
-    env.read_env(path) 
+    if path is not None:
+        _env.read_env(path)
     return AmoCRM(
-            account_id=env('ACCOUNT_ID'),
-            token=env('TOKEN_AMOCRM')) 
+            account_id=_env('ACCOUNT_ID'),
+            token=_env('TOKEN_AMOCRM')) 
 
     
\ No newline at end of file
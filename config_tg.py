@@ -21,8 +21,13 @@
 """
 
 from dataclasses import dataclass
+from functools import lru_cache
 from environs import Env 
 
+# Переменные окружения и файл .env читаются один раз при импорте модуля
+_env = Env()
+_env.read_env()
+
 @dataclass
 class TgBot():
     """
@@ -47,27 +52,32 @@ class Config:
     tg_bot: TgBot 
 
 
+@lru_cache(maxsize=1)
 def load_config(path: str | None = None) -> Config:
     """
     Загружает конфигурацию для Telegram бота из .env файла.
 
     Аргументы:
         path (str | None): Опциональный путь к .env файлу. 
-                           Если не указан, будет использован файл по умолчанию.
+                           Если не указан, используются переменные, прочитанные
+                           при импорте модуля.
 
     Возвращает:
         Config: Возвращает экземпляр класса Config, который содержит 
                 настройки бота (токен и идентификаторы администраторов).
 
+    Результат кешируется: объект конфигурации создается один раз за время работы процесса,
+    так как конфигурация не меняется.
+
     Исключения:
         Raises KeyError если переменные окружения (BOT_TOKEN или ADMIN_ID) не найдены.
     """
     
-    env = Env()
-    env.read_env(path) 
+    if path is not None:
+        _env.read_env(path)
     return Config(
         tg_bot=TgBot(
-            token=env('BOT_TOKEN'),
-            admin_ids=env('ADMIN_ID')) 
+            token=_env('BOT_TOKEN'),
+            admin_ids=_env('ADMIN_ID')) 
         )
     
\ No newline at end of file
@@ -5,95 +5,241 @@
 - Отправку сообщений в Telegram через функцию send_to_telegram.
 - Получение данных по сделкам из AmoCRM через функцию get_leads_from_amocrm.
 - Формирование ежедневного отчета о выручке через функцию daily_report_revenue.
+- Ежедневный запуск отчета планировщиком (scheduler) и обработку ошибок запуска.
 
 Каждый тест использует патчинг для имитации поведения зависимостей и проверки корректной обработки данных.
 """
 
 import unittest
+from aiogram import exceptions
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_MISSED, JobExecutionEvent
 from unittest.mock import patch, AsyncMock, Mock, MagicMock
 from config_tg import Config, TgBot
 from config_amocrm import AmoCRM
 import asyncio
 import datetime
-from amocrm import send_to_telegram, get_leads_from_amocrm, daily_report_revenue, main
+import httpx
+from amocrm import MESSAGE_LIMIT, REPORT_MISFIRE_GRACE_TIME, _day_bounds, _on_job_event, send_to_telegram, get_leads_from_amocrm, daily_report_revenue, main_async, run, scheduler, shutdown
+
+
+async def aiter_leads(leads):
+    # Асинхронный итератор по сделкам, имитирующий get_leads_from_amocrm
+    for lead in leads:
+        yield lead
+
+
+async def collect(leads):
+    return [lead async for lead in leads]
+
+
+def responses(*pages):
+    # Ответы AmoCRM для подмены _HTTPX.send: dict - JSON страницы, None - 204 No Content, int - код ошибки,
+    # исключение - ошибка транспорта. После заданных ответов возвращается 204 No Content.
+    pages = iter(pages)
+
+    def send(request):
+        page = next(pages, None)
+        if isinstance(page, Exception):
+            raise page
+        if page is None:
+            return httpx.Response(204, request=request)
+        if isinstance(page, int):
+            return httpx.Response(page, request=request)
+        return httpx.Response(200, json=page, request=request)
+
+    return send
 
 
 class TestFunctions(unittest.TestCase):
+    @patch('amocrm._BOT', None)
     @patch('amocrm.Bot')
     @patch('amocrm.load_config', return_value=Config(tg_bot=TgBot(token='fake_token', admin_ids='fake_ids')))
-    @patch('logging.info')
-    @patch('logging.error')
+    @patch('amocrm.logger')
     # Проверка отправки сообщений через телеграмм 
-    def test_send_to_telegram(self, mock_error, mock_info, mock_load_config, mock_bot):
+    def test_send_to_telegram(self, mock_logger, mock_load_config, mock_bot):
         mock_bot.return_value.send_message = AsyncMock()
 
         message = "Test message"
         asyncio.run(send_to_telegram(message))
 
         # Проверка логирования
-        mock_info.assert_any_call('Start - send_to_telegram')
+        mock_logger.debug.assert_any_call('Start - send_to_telegram')
         mock_bot.return_value.send_message.assert_called_once_with(chat_id='fake_ids', text=message)
 
 
-    @patch('amocrm.requests.get')
-    @patch('logging.info')
-    @patch('logging.error')
+    @patch('amocrm._BOT', None)
+    @patch('amocrm.asyncio.sleep', new_callable=AsyncMock)
+    @patch('amocrm.Bot')
+    @patch('amocrm.load_config', return_value=Config(tg_bot=TgBot(token='fake_token', admin_ids='fake_ids')))
+    @patch('amocrm.logger')
+    # Проверка повторной отправки сообщения после ограничения частоты Telegram
+    def test_send_to_telegram_retry_after(self, mock_logger, mock_load_config, mock_bot, mock_sleep):
+        retry_after = exceptions.TelegramRetryAfter(method=Mock(), message='Flood control exceeded', retry_after=3)
+        mock_bot.return_value.send_message = AsyncMock(side_effect=[retry_after, None])
+
+        asyncio.run(send_to_telegram("Test message"))
+
+        # Проверки
+        mock_sleep.assert_awaited_once_with(3)
+        self.assertEqual(mock_bot.return_value.send_message.await_count, 2)
+        mock_logger.error.assert_not_called()
+
+
+    @patch('amocrm._HTTPX.send', new_callable=AsyncMock)
+    @patch('amocrm.logger')
     # Проверка получения данных по сделкам 
-    def test_get_leads_from_amocrm(self, mock_error, mock_info, mock_requests_get):
-        mock_response = Mock()
-        mock_response.json.return_value = {'_embedded': {'leads': []}}
-        mock_requests_get.return_value = mock_response
+    def test_get_leads_from_amocrm(self, mock_logger, mock_httpx_send):
+        mock_httpx_send.side_effect = responses({'_embedded': {'leads': [{'id': 1, 'price': 10.5}]}})
 
         account_id = "fake_account"
         token = "fake_token"
-        result = get_leads_from_amocrm(account_id, token)
+        result = asyncio.run(collect(get_leads_from_amocrm(account_id, token, date_from=100, date_to=200)))
 
         # Проверка логов
-        mock_info.assert_any_call('Start get_leads_from_amocrm')
+        mock_logger.debug.assert_any_call('Start get_leads_from_amocrm')
+        # Проверка фильтра по дате создания на стороне AmoCRM
+        params = mock_httpx_send.call_args.args[0].url.params
+        self.assertEqual(params['filter[created_at][from]'], '100')
+        self.assertEqual(params['filter[created_at][to]'], '200')
+        # Проверка результата
+        self.assertEqual(result, [{'id': 1, 'price': 10.5}])
+
+
+    @patch('amocrm._HTTPX.send', new_callable=AsyncMock)
+    @patch('amocrm.logger')
+    # Проверка постраничного получения данных по сделкам
+    def test_get_leads_from_amocrm_pagination(self, mock_logger, mock_httpx_send):
+        next_url = 'https://fake_account.amocrm.ru/api/v4/leads?page=2&limit=2'
+        mock_httpx_send.side_effect = responses(
+            {'_embedded': {'leads': [{'id': 1}, {'id': 2}]}, '_links': {'next': {'href': next_url}}},
+            {'_embedded': {'leads': [{'id': 3}]}, '_links': {}},
+        )
+
+        result = asyncio.run(collect(get_leads_from_amocrm("fake_account", "fake_token", date_from=100, date_to=200, page_limit=2)))
+
+        # Проверка результата
+        self.assertEqual(result, [{'id': 1}, {'id': 2}, {'id': 3}])
+        self.assertEqual(mock_httpx_send.call_count, 2)
+        self.assertEqual(str(mock_httpx_send.call_args.args[0].url), next_url)
+
+
+    @patch('amocrm._HTTPX.send', new_callable=AsyncMock)
+    @patch('amocrm.logger')
+    # Проверка параллельной загрузки страниц по известному числу страниц
+    def test_get_leads_from_amocrm_page_count(self, mock_logger, mock_httpx_send):
+        mock_httpx_send.side_effect = responses(
+            {'_page_count': 3, '_embedded': {'leads': [{'id': 1}, {'id': 2}]}, '_links': {'next': {'href': 'page=2'}}},
+            {'_page_count': 3, '_embedded': {'leads': [{'id': 3}, {'id': 4}]}, '_links': {'next': {'href': 'page=3'}}},
+            {'_page_count': 3, '_embedded': {'leads': [{'id': 5}]}, '_links': {}},
+        )
+
+        result = asyncio.run(collect(get_leads_from_amocrm("fake_account", "fake_token", date_from=100, date_to=200, page_limit=2)))
+
+        # Проверка результата
+        self.assertEqual(result, [{'id': 1}, {'id': 2}, {'id': 3}, {'id': 4}, {'id': 5}])
+        requested_pages = sorted(call.args[0].url.params['page'] for call in mock_httpx_send.call_args_list)
+        self.assertEqual(requested_pages, ['1', '2', '3'])
+
+
+    @patch('amocrm._HTTPX.send', new_callable=AsyncMock)
+    @patch('amocrm.logger')
+    # Проверка ответа 204 No Content при отсутствии сделок
+    def test_get_leads_from_amocrm_no_content(self, mock_logger, mock_httpx_send):
+        mock_httpx_send.side_effect = responses(None)
+
+        result = asyncio.run(collect(get_leads_from_amocrm("fake_account", "fake_token", date_from=100, date_to=200)))
+
+        # Проверка результата
+        self.assertEqual(result, [])
+
+
+    @patch('amocrm.asyncio.sleep', new_callable=AsyncMock)
+    @patch('amocrm._HTTPX.send', new_callable=AsyncMock)
+    @patch('amocrm.logger')
+    # Проверка повтора запроса при временной ошибке AmoCRM
+    def test_get_leads_from_amocrm_retry(self, mock_logger, mock_httpx_send, mock_sleep):
+        mock_httpx_send.side_effect = responses(503, {'_embedded': {'leads': [{'id': 1}]}})
+
+        result = asyncio.run(collect(get_leads_from_amocrm("fake_account", "fake_token", date_from=100, date_to=200)))
+
+        # Проверка результата
+        self.assertEqual(result, [{'id': 1}])
+        self.assertEqual(mock_httpx_send.call_count, 2)
+        mock_sleep.assert_awaited_once()
+
+
+    @patch('amocrm.asyncio.sleep', new_callable=AsyncMock)
+    @patch('amocrm._HTTPX.send', new_callable=AsyncMock)
+    @patch('amocrm.logger')
+    # Проверка повтора запроса после таймаута AmoCRM
+    def test_get_leads_from_amocrm_timeout_retry(self, mock_logger, mock_httpx_send, mock_sleep):
+        mock_httpx_send.side_effect = responses(httpx.ReadTimeout('timed out'), {'_embedded': {'leads': [{'id': 1}]}})
+
+        result = asyncio.run(collect(get_leads_from_amocrm("fake_account", "fake_token", date_from=100, date_to=200)))
+
+        # Проверка результата
+        self.assertEqual(result, [{'id': 1}])
+        self.assertEqual(mock_httpx_send.call_args.args[0].extensions['timeout'], {'connect': 3.05, 'read': 27.0, 'write': 27.0, 'pool': 27.0})
+        mock_sleep.assert_awaited_once()
+
+
+    # Проверка границ дня для фильтра сделок
+    def test_day_bounds(self):
+        day = datetime.date(2024, 11, 22)
+
+        lo, hi = _day_bounds(day)
+
+        # Проверки
+        self.assertEqual(datetime.datetime.fromtimestamp(lo), datetime.datetime(2024, 11, 22))
+        self.assertEqual(datetime.datetime.fromtimestamp(hi), datetime.datetime(2024, 11, 23))
+
+
+    @patch('amocrm.asyncio.sleep', new_callable=AsyncMock)
+    @patch('amocrm._HTTPX.send', new_callable=AsyncMock)
+    @patch('amocrm.logger')
+    # Проверка повтора запроса после обрыва соединения
+    def test_get_leads_from_amocrm_connection_drop_retry(self, mock_logger, mock_httpx_send, mock_sleep):
+        mock_httpx_send.side_effect = responses(httpx.RemoteProtocolError('Server disconnected'), {'_embedded': {'leads': [{'id': 1}]}})
+
+        result = asyncio.run(collect(get_leads_from_amocrm("fake_account", "fake_token", date_from=100, date_to=200)))
+
         # Проверка результата
-        self.assertEqual(result, mock_response)
+        self.assertEqual(result, [{'id': 1}])
+        self.assertEqual(mock_httpx_send.call_count, 2)
 
 
     @patch('amocrm.load_amocrm', return_value=AmoCRM(account_id='fake_account_id', token='fake_token'))
     @patch('amocrm.get_leads_from_amocrm')
-    @patch('logging.info')
-    @patch('logging.error')
+    @patch('amocrm.logger')
     # Проверка получения данных по еженедельным сделкам
-    def test_daily_report_revenue_success(self, mock_error, mock_info, mock_get_leads_from_amocrm, mock_load_amocrm):
-        mock_get_leads_from_amocrm.return_value = MagicMock()
-        mock_get_leads_from_amocrm.return_value.json.return_value = {
-            '_embedded': {
-                'leads': [
-                    {
-                        'created_at': (datetime.datetime.now() - datetime.timedelta(days=0)).timestamp(),  # Сегодняшняя дата
-                        'responsible_user_id': 1,
-                        'price': 1000
-                    },
-                    {
-                        'created_at': (datetime.datetime.now() - datetime.timedelta(days=1)).timestamp(),  # Вчерашняя дата
-                        'responsible_user_id': 2,
-                        'price': 1500
-                    }
-                ]
-            }
-        }
-
-        revenue = daily_report_revenue()
+    def test_daily_report_revenue_success(self, mock_logger, mock_get_leads_from_amocrm, mock_load_amocrm):
+        mock_get_leads_from_amocrm.return_value = aiter_leads([
+            {'created_at': int(datetime.datetime.now().timestamp()), 'responsible_user_id': 1, 'price': 1000},
+            {'created_at': int(datetime.datetime.now().timestamp()), 'responsible_user_id': 2, 'price': 1500},
+            {'created_at': int(datetime.datetime.now().timestamp()), 'responsible_user_id': 1, 'price': 500},
+            {'created_at': int((datetime.datetime.now() - datetime.timedelta(days=1)).timestamp()), 'responsible_user_id': 3, 'price': 700},  # Вчерашняя дата
+        ])
+
+        today, revenue = asyncio.run(daily_report_revenue())
 
         # Проверка результата
-        expected_result = {1: 1000}
+        expected_result = {1: 1500, 2: 1500}
         self.assertDictEqual(revenue, expected_result)
+        self.assertIsInstance(revenue[1], int)
+        self.assertEqual(today, datetime.date.today())
+        # Проверка фильтра по сегодняшней дате
+        today_start = int(datetime.datetime.combine(datetime.date.today(), datetime.time.min).timestamp())
+        self.assertEqual(mock_get_leads_from_amocrm.call_args.kwargs['date_from'], today_start)
 
 
     @patch('amocrm.load_amocrm', return_value=AmoCRM(account_id='fake_account_id', token='fake_token'))
     @patch('amocrm.get_leads_from_amocrm')
-    @patch('logging.info')
-    @patch('logging.error')
+    @patch('amocrm.logger')
     # Проверка получения данных по еженедельным сделкам при отсутствии сделок
-    def test_daily_report_revenue_no_data(self, mock_error, mock_info, mock_get_leads_from_amocrm, mock_load_amocrm):
-        mock_get_leads_from_amocrm.return_value = None
+    def test_daily_report_revenue_no_data(self, mock_logger, mock_get_leads_from_amocrm, mock_load_amocrm):
+        mock_get_leads_from_amocrm.return_value = aiter_leads([])
 
-        revenue = daily_report_revenue()
+        today, revenue = asyncio.run(daily_report_revenue())
 
         # Проверка результата
         self.assertDictEqual(revenue, {})
@@ -101,13 +247,12 @@ class TestFunctions(unittest.TestCase):
     
     @patch('amocrm.load_amocrm', return_value=AmoCRM(account_id='fake_account_id', token='fake_token'))
     @patch('amocrm.get_leads_from_amocrm')
-    @patch('logging.info')
-    @patch('logging.error')
+    @patch('amocrm.logger')
     # Проверка получения данных по еженедельным сделкам при ошибке
-    def test_daily_report_revenue_status_code_not_200(self, mock_error, mock_info, mock_get_leads_from_amocrm, mock_load_amocrm):
-        mock_get_leads_from_amocrm.return_value = {'status_code': 400}
+    def test_daily_report_revenue_status_code_not_200(self, mock_logger, mock_get_leads_from_amocrm, mock_load_amocrm):
+        mock_get_leads_from_amocrm.side_effect = httpx.HTTPError('400 Client Error')
 
-        revenue = daily_report_revenue()
+        today, revenue = asyncio.run(daily_report_revenue())
 
         # Проверка результата
         self.assertDictEqual(revenue, {})
@@ -115,14 +260,12 @@ class TestFunctions(unittest.TestCase):
    
     @patch('amocrm.load_amocrm', return_value=AmoCRM(account_id='fake_account_id', token='fake_token'))
     @patch('amocrm.get_leads_from_amocrm')
-    @patch('logging.info')
-    @patch('logging.error')
+    @patch('amocrm.logger')
     # Проверка при возникновении ошибки KeyError в процессе парсинга JSON-данных.
-    def test_daily_report_revenue_keyerror_in_json(self, mock_error, mock_info, mock_get_leads_from_amocrm, mock_load_amocrm):
-        mock_get_leads_from_amocrm.return_value = MagicMock()
-        mock_get_leads_from_amocrm.return_value.json.side_effect = KeyError
+    def test_daily_report_revenue_keyerror_in_json(self, mock_logger, mock_get_leads_from_amocrm, mock_load_amocrm):
+        mock_get_leads_from_amocrm.side_effect = KeyError('_embedded')
 
-        revenue = daily_report_revenue()
+        today, revenue = asyncio.run(daily_report_revenue())
 
         # Проверка результата
         self.assertDictEqual(revenue, {})
@@ -130,19 +273,100 @@ class TestFunctions(unittest.TestCase):
 
     @patch('amocrm.send_to_telegram')
     @patch('amocrm.daily_report_revenue')
-    @patch('logging.info')
-    @patch('logging.error')
+    @patch('amocrm.logger')
     # Проверка основной функции в части успешного получения данных о выручке за день
-    def test_main(self, mock_error, mock_info, mock_daily_report_revenue, mock_send_to_telegram):
-        mock_daily_report_revenue.return_value = {1: 1000}
+    def test_main_async(self, mock_logger, mock_daily_report_revenue, mock_send_to_telegram):
+        mock_daily_report_revenue.return_value = (datetime.date(2024, 11, 22), {1: 1000})
 
-        main()
+        asyncio.run(main_async())
 
         # Проверки
-        message = f'Отчет по выручке на {datetime.date.today()}:\n\nМенеджер ID: 1, Выручка: 1000\n'
+        message = 'Отчет по выручке на 2024-11-22:\n\nМенеджер ID: 1, Выручка: 1000'
         mock_send_to_telegram.assert_called_once_with(message)
-        mock_info.assert_any_call('Start - main')
+        mock_logger.debug.assert_any_call('Start - main_async')
+
+
+    @patch('amocrm.send_to_telegram')
+    @patch('amocrm.daily_report_revenue')
+    @patch('amocrm.logger')
+    # Проверка разбиения длинного отчета на несколько сообщений
+    def test_main_async_splits_long_report(self, mock_logger, mock_daily_report_revenue, mock_send_to_telegram):
+        mock_daily_report_revenue.return_value = (datetime.date(2024, 11, 22), {manager_id: 1000 for manager_id in range(1000)})
+
+        asyncio.run(main_async())
+
+        # Проверки
+        messages = [call.args[0] for call in mock_send_to_telegram.call_args_list]
+        self.assertGreater(len(messages), 1)
+        self.assertTrue(all(len(message) <= MESSAGE_LIMIT for message in messages))
+        self.assertEqual(sum(message.count('Менеджер ID:') for message in messages), 1000)
+        self.assertTrue(messages[0].startswith('Отчет по выручке на 2024-11-22:\n\nМенеджер ID: 0,'))
+
 
+
+    @patch('amocrm.asyncio.Event')
+    @patch('amocrm.AsyncIOScheduler')
+    @patch('amocrm.logger')
+    # Проверка регистрации ежедневного запуска отчета в 18:00
+    def test_scheduler_runs_report_at_18(self, mock_logger, mock_scheduler, mock_event):
+        mock_event.return_value.wait = AsyncMock(side_effect=asyncio.CancelledError)
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(scheduler())
+
+        # Проверки
+        sched = mock_scheduler.return_value
+        func, trigger = sched.add_job.call_args.args
+        self.assertIs(func, main_async)
+        self.assertEqual(str(trigger.fields[trigger.FIELD_NAMES.index('hour')]), '18')
+        self.assertEqual(str(trigger.fields[trigger.FIELD_NAMES.index('minute')]), '0')
+        self.assertEqual(sched.add_job.call_args.kwargs['misfire_grace_time'], REPORT_MISFIRE_GRACE_TIME)
+        sched.add_listener.assert_called_once_with(_on_job_event, EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+        sched.start.assert_called_once()
+        sched.shutdown.assert_called_once_with(wait=False)
+
+
+    @patch('amocrm.logger')
+    # Проверка логирования ошибки ежедневного отчета без остановки планировщика
+    def test_on_job_event_logs_error(self, mock_logger):
+        error = RuntimeError('network is down')
+        event = JobExecutionEvent(EVENT_JOB_ERROR, 'report', 'default', datetime.datetime.now(), exception=error)
+
+        _on_job_event(event)
+
+        # Проверки
+        mock_logger.error.assert_called_once_with('Scheduled report failed: %r', error, exc_info=error)
+
+
+    @patch('amocrm._HTTPX.aclose', new_callable=AsyncMock)
+    @patch('amocrm._BOT')
+    # Проверка закрытия сессий бота и клиента AmoCRM при остановке
+    def test_shutdown(self, mock_bot, mock_httpx_aclose):
+        mock_bot.session.close = AsyncMock()
+
+        asyncio.run(shutdown())
+
+        # Проверки
+        mock_bot.session.close.assert_awaited_once()
+        mock_httpx_aclose.assert_awaited_once()
+
+
+    @patch('amocrm.shutdown', new_callable=AsyncMock)
+    @patch('amocrm.scheduler', new_callable=AsyncMock)
+    @patch('amocrm.load_amocrm')
+    @patch('amocrm.load_config')
+    # Проверка запуска на цикле событий без поддержки сигналов (Windows)
+    def test_run_without_signal_handlers(self, mock_load_config, mock_load_amocrm, mock_scheduler, mock_shutdown):
+        async def run_without_signals():
+            loop = asyncio.get_running_loop()
+            with patch.object(loop, 'add_signal_handler', side_effect=NotImplementedError):
+                await run()
+
+        asyncio.run(run_without_signals())
+
+        # Проверки
+        mock_scheduler.assert_awaited_once()
+        mock_shutdown.assert_awaited_once()
     
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file